@@ -2,37 +2,31 @@
 # Author: Khaled Ouriemmi (https://github.com/khaledouriemmi)
 # Run: python djerba.py test.djerba
 
-import sys, re, math
-from dataclasses import dataclass
-from typing import List, Tuple, Any, Dict, Optional
+import sys, re, math, operator, functools
+from array import array
+from dataclasses import dataclass, field, fields
+from typing import List, Tuple, Any, Dict, Optional, Callable
 
 # ----------------------
 # Lexer
 # ----------------------
 
+# Most frequent kinds first: re tries the alternatives left to right.
+# Keywords aren't in here at all; they're lexed as IDENT and renamed via KEYWORDS.
 TOKEN_SPEC = [
-    ('NUMBER',   r'\d+(\.\d+)?'),         # 123, 3.14
-    ('STRING',   r'"([^"\\]|\\.)*"'),     # "hello"
-    ('ARROW',    r'<-'),                  # assignment
-    ('PRINT',    r':>'),                  # print
-    ('FORLOOP',  r'@>'),                  # for loop
-    ('IF',       r'\?'),                  # if
-    ('WHILE',    r'~'),                   # while
-    ('FUNC',     r'@'),                   # function def
-    ('RETURN',   r'!>'),                  # return
-    ('TRUE',     r'\btrue\b'),            # boolean true
-    ('FALSE',    r'\bfalse\b'),           # boolean false
-    ('AND',      r'\band\b'),             # logical and
-    ('OR',       r'\bor\b'),              # logical or
-    ('NOT',      r'\bnot\b'),             # logical not
-    ('IN',       r'\bin\b'),              # for loop in
-    ('BREAK',    r'\bbreak\b'),           # break
-    ('CONTINUE', r'\bcontinue\b'),        # continue
-    ('ELSE',     r'\belse\b'),
+    ('SKIP',     r'[ \t\r]+'),
+    ('NEWLINE',  r'\n'),
     ('IDENT',    r'[A-Za-z_][A-Za-z0-9_]*'),
-    ('DOLLAR',   r'\$'),
-    ('OP',       r'[+\-*\/\^%]'),
-    ('CMP',      r'(==|!=|<=|>=|<|>)'),
+    ('NUMBER',   r'\d+(?:\.\d+)?'),       # 123, 3.14
+    ('STRING',   r'"(?:[^"\\]|\\.)*"'),   # "hello"
+    ('PLUS',     r'\+'),
+    ('MINUS',    r'-'),
+    ('STAR',     r'\*'),
+    ('SLASH',    r'/'),
+    ('PERCENT',  r'%'),
+    ('CARET',    r'\^'),
+    ('ARROW',    r'<-'),                  # assignment (before CMP, which would take the '<')
+    ('CMP',      r'==|!=|<=|>=|<|>'),
     ('LPAREN',   r'\('),
     ('RPAREN',   r'\)'),
     ('LBRACE',   r'\{'),
@@ -40,31 +34,113 @@ TOKEN_SPEC = [
     ('LBRACKET', r'\['),                  # list start
     ('RBRACKET', r'\]'),                  # list end
     ('COMMA',    r','),
-    ('NEWLINE',  r'\n'),
-    ('SKIP',     r'[ \t\r]+'),
+    ('DOLLAR',   r'\$'),
+    ('PRINT',    r':>'),                  # print
+    ('FORLOOP',  r'@>'),                  # for loop
+    ('IF',       r'\?'),                  # if
+    ('WHILE',    r'~'),                   # while
+    ('FUNC',     r'@'),                   # function def
+    ('RETURN',   r'!>'),                  # return
     ('COMMENT',  r';;[^\n]*'),
 ]
+KEYWORDS = {
+    'true': 'TRUE',                       # boolean true
+    'false': 'FALSE',                     # boolean false
+    'and': 'AND',                         # logical and
+    'or': 'OR',                           # logical or
+    'not': 'NOT',                         # logical not
+    'in': 'IN',                           # for loop in
+    'break': 'BREAK',                     # break
+    'continue': 'CONTINUE',               # continue
+    'else': 'ELSE',
+}
 MASTER_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_SPEC))
+# Patterns use only non-capturing groups, so a match's lastindex is its
+# TOKEN_SPEC position + 1; indexing this is cheaper than asking for lastgroup.
+GROUP_KINDS = (None,) + tuple(name for name, _ in TOKEN_SPEC)
 
-@dataclass
-class Token:
-    type: str
-    value: str
-    pos: int
-
-def lex(source: str) -> List[Token]:
-    tokens = []
-    for m in MASTER_RE.finditer(source):
-        kind = m.lastgroup
-        val = m.group()
-        if kind in ('SKIP', 'COMMENT'):
+def _one_char_kinds() -> Dict[str, str]:
+    # A character is a whole token when MASTER_RE takes just that character
+    # (as the same kind) whatever follows it, e.g. '(' or '+' but not '<'.
+    chars = [chr(i) for i in range(32, 127)] + ['\t', '\r', '\n']
+    kinds: Dict[str, str] = {}
+    for c in chars:
+        first = MASTER_RE.match(c)
+        if first is None or first.end() != 1:
             continue
-        if kind == 'STRING':
-            #
-            pass
-        tokens.append(Token(kind, val, m.start()))
-    tokens.append(Token('EOF', '', len(source)))
-    return tokens
+        if all((m := MASTER_RE.match(c + nxt)).end() == 1 and m.lastgroup == first.lastgroup
+               for nxt in chars):
+            kinds[c] = first.lastgroup
+    return kinds
+
+# Lexing looks these up before falling back to MASTER_RE, which would
+# otherwise try every alternative in turn at each position.
+ONE_CHAR_KINDS = _one_char_kinds()
+
+# Escapes recognised inside string literals; any other backslash is kept as written.
+_ESC = {'\\n': '\n', '\\t': '\t', '\\r': '\r', '\\"': '"', '\\\\': '\\'}
+_ESC_RE = re.compile(r'\\[ntr"\\]')
+
+def _unescape(m: re.Match) -> str:
+    return _ESC[m[0]]
+
+# Tokens are stored column-wise: token i is (types[i], values[i], positions[i]).
+# NUMBER values are already floats, STRING values are unquoted and unescaped,
+# and IDENT values are interned.
+Tokens = Tuple[List[str], List[Any], array]
+
+def lex(source: str) -> Tokens:
+    types: List[str] = []
+    values: List[Any] = []
+    positions = array('i')
+    # NEWLINEs only separate statements: collapse runs of them and drop the
+    # ones at the start, after '{', before '}' and at the end.
+    last = None
+    match = MASTER_RE.match
+    one_char = ONE_CHAR_KINDS
+    group_kinds = GROUP_KINDS
+    pos = 0
+    end = len(source)
+    while pos < end:
+        start = pos
+        val = source[pos]
+        kind = one_char.get(val)
+        if kind is not None:
+            pos += 1
+        else:
+            m = match(source, pos)
+            if m is None:  # not the start of any token: skipped, as finditer did
+                pos += 1
+                continue
+            kind = group_kinds[m.lastindex]
+            val = m[0]
+            pos = m.end()
+            if kind == 'IDENT':
+                kind = KEYWORDS.get(val, 'IDENT')
+                val = sys.intern(val)  # names end up as dict keys in every later pass
+            elif kind == 'NUMBER':
+                val = float(val)
+            elif kind == 'STRING':
+                val = val[1:-1]
+                if '\\' in val:
+                    val = _ESC_RE.sub(_unescape, val)
+            elif kind in ('SKIP', 'COMMENT'):
+                continue
+        if kind == 'NEWLINE':
+            if last in ('NEWLINE', 'LBRACE', None):
+                continue
+        elif kind == 'RBRACE' and last == 'NEWLINE':
+            types.pop(); values.pop(); positions.pop()
+        types.append(kind)
+        values.append(val)
+        positions.append(start)
+        last = kind
+    if last == 'NEWLINE':
+        types.pop(); values.pop(); positions.pop()
+    types.append('EOF')
+    values.append('')
+    positions.append(len(source))
+    return types, values, positions
 
 # ----------------------
 # Parser (recursive descent)
@@ -72,107 +148,136 @@ def lex(source: str) -> List[Token]:
 
 class ParseError(Exception): pass
 
-@dataclass
+# Operator symbol -> implementation, bound onto BinOp/Compare nodes at parse time.
+BINOPS = {'+': operator.add, '-': operator.sub, '*': operator.mul,
+          '/': operator.truediv, '%': operator.mod, '^': operator.pow}
+CMPOPS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt,
+          '>': operator.gt, '<=': operator.le, '>=': operator.ge}
+
+@dataclass(slots=True)
 class Node: ...
-@dataclass
-class Program(Node): body: List[Node]
-@dataclass
+@dataclass(slots=True)
+class Program(Node): body: List[Node]; nslots: int = 0
+@dataclass(slots=True)
 class Print(Node): args: List[Node]
-@dataclass
+@dataclass(slots=True)
 class Assign(Node): name: str; expr: Node
-@dataclass
+@dataclass(slots=True)
 class If(Node): cond: Node; then: List[Node]; els: Optional[List[Node]]
-@dataclass
+@dataclass(slots=True)
 class While(Node): cond: Node; body: List[Node]
-@dataclass
-class ForLoop(Node): var: str; iterable: Node; body: List[Node]
-@dataclass
-class FuncDef(Node): name: str; params: List[str]; body: List[Node]
-@dataclass
+@dataclass(slots=True)
+class ForLoop(Node):
+    var: str; iterable: Node; body: List[Node]
+    slot: int = 0; is_global: bool = False  # where the Resolver put var
+@dataclass(slots=True)
+class FuncDef(Node):
+    name: str; params: List[str]; body: List[Node]; nslots: int = 0
+    frame_pool: List[Any] = field(default_factory=list, repr=False)  # idle call frames
+    jit_impl: Optional[Callable] = field(default=None, repr=False)   # set by attach_jit
+    compiled: Optional[Callable] = field(default=None, repr=False)   # body closure, built on first call
+    callers: List[Any] = field(default_factory=list, repr=False)     # Calls bound to it once defined
+@dataclass(slots=True)
 class Return(Node): expr: Node
-@dataclass
+@dataclass(slots=True)
 class Break(Node): pass
-@dataclass
+@dataclass(slots=True)
 class Continue(Node): pass
 
 # Expressions
-@dataclass
+@dataclass(slots=True)
 class Var(Node): name: str
-@dataclass
+@dataclass(slots=True)
 class Num(Node): value: float
-@dataclass
+@dataclass(slots=True)
 class Str(Node): value: str
-@dataclass
+@dataclass(slots=True)
 class Bool(Node): value: bool
-@dataclass
-class List_(Node): elements: List[Node]  # List_ to avoid shadowing built-in
-@dataclass
+@dataclass(slots=True)
+class List_(Node):  # List_ to avoid shadowing built-in
+    elements: List[Node]
+    literal: Optional[tuple] = None  # element values, when every element is a literal
+@dataclass(slots=True)
 class Index(Node): obj: Node; idx: Node
-@dataclass
-class Call(Node): name: str; args: List[Node]
-@dataclass
-class BinOp(Node): op: str; left: Node; right: Node
-@dataclass
-class Compare(Node): op: str; left: Node; right: Node
-@dataclass
+# Index forms the Optimizer picks when the index is known to be an int already.
+@dataclass(slots=True)
+class IndexConst(Node): obj: Node; idx: int
+@dataclass(slots=True)
+class IndexInt(Node): obj: Node; idx: Node   # idx is a range() loop variable
+@dataclass(slots=True)
+class Call(Node):
+    name: str; args: List[Node]
+    func: Optional[FuncDef] = field(default=None, repr=False)  # bound when the FuncDef runs
+@dataclass(slots=True)
+class BinOp(Node):
+    op: str; left: Node; right: Node
+    fn: Callable[[Any, Any], Any] = field(init=False, repr=False)
+    def __post_init__(self): self.fn = BINOPS[self.op]
+@dataclass(slots=True)
+class Compare(Node):
+    op: str; left: Node; right: Node
+    fn: Callable[[Any, Any], Any] = field(init=False, repr=False)
+    def __post_init__(self): self.fn = CMPOPS[self.op]
+@dataclass(slots=True)
 class LogicalOp(Node): op: str; left: Node; right: Optional[Node] = None  # right is None for 'not'
+@dataclass(slots=True)
+class Neg(Node): expr: Node
 
 class Parser:
-    def __init__(self, tokens: List[Token]):
-        self.ts = tokens
+    def __init__(self, tokens: Tokens):
+        self.types, self.values, self.positions = tokens
         self.i = 0
 
-    def peek(self, *types) -> bool:
-        return self.ts[self.i].type in types
-
-    def expect(self, ttype: str) -> Token:
-        tok = self.ts[self.i]
-        if tok.type != ttype:
-            raise ParseError(f'Expected {ttype}, got {tok.type} at {tok.pos}')
-        self.i += 1
-        return tok
+    def expect(self, ttype: str) -> Any:
+        i = self.i
+        if self.types[i] != ttype:
+            raise ParseError(f'Expected {ttype}, got {self.types[i]} at {self.positions[i]}')
+        self.i = i + 1
+        return self.values[i]
 
-    def match(self, ttype: str) -> Optional[Token]:
-        if self.peek(ttype):
-            return self.expect(ttype)
-        return None
+    def match(self, ttype: str) -> bool:
+        if self.types[self.i] == ttype:
+            self.i += 1
+            return True
+        return False
 
+    # The hot methods below read self.types/self.values through locals and
+    # step self.i directly once they've checked the current token's type.
     def parse(self) -> Program:
+        types = self.types
         stmts = []
-        while not self.peek('EOF'):
-            if self.peek('NEWLINE'):
-                self.expect('NEWLINE'); continue
+        while types[self.i] != 'EOF':
             stmts.append(self.statement())
-            self.match('NEWLINE')
+            if types[self.i] == 'NEWLINE': self.i += 1
         return Program(stmts)
 
     def block(self) -> List[Node]:
         self.expect('LBRACE')
+        types = self.types
         body = []
-        while not self.peek('RBRACE'):
-            if self.peek('NEWLINE'):
-                self.expect('NEWLINE'); continue
+        while types[self.i] != 'RBRACE':
             body.append(self.statement())
-            self.match('NEWLINE')
+            if types[self.i] == 'NEWLINE': self.i += 1
         self.expect('RBRACE')
         return body
 
     def statement(self) -> Node:
-        if self.peek('PRINT'):
-            self.expect('PRINT')
+        t = self.types[self.i]
+        if t == 'PRINT':
+            self.i += 1
             args = [self.expr()]
             while self.match('COMMA'):
                 args.append(self.expr())
             return Print(args)
 
-        if self.peek('DOLLAR'):
-            self.expect('DOLLAR')
-            name = self.expect('IDENT').value
+        if t == 'DOLLAR':
+            self.i += 1
+            name = self.expect('IDENT')
             self.expect('ARROW')
             return Assign(name, self.expr())
 
-        if self.peek('IF'):
-            self.expect('IF')
+        if t == 'IF':
+            self.i += 1
             cond = self.expr()
             then = self.block()
             els = None
@@ -180,44 +285,44 @@ class Parser:
                 els = self.block()
             return If(cond, then, els)
 
-        if self.peek('WHILE'):
-            self.expect('WHILE')
+        if t == 'WHILE':
+            self.i += 1
             cond = self.expr()
             body = self.block()
             return While(cond, body)
 
-        if self.peek('FORLOOP'):
-            self.expect('FORLOOP')
+        if t == 'FORLOOP':
+            self.i += 1
             self.expect('DOLLAR')
-            var = self.expect('IDENT').value
+            var = self.expect('IDENT')
             self.expect('IN')
             iterable = self.expr()
             body = self.block()
             return ForLoop(var, iterable, body)
 
-        if self.peek('FUNC'):
-            self.expect('FUNC')
-            name = self.expect('IDENT').value
+        if t == 'FUNC':
+            self.i += 1
+            name = self.expect('IDENT')
             self.expect('LPAREN')
             params = []
-            if not self.peek('RPAREN'):
-                params.append(self.expect('IDENT').value)
+            if self.types[self.i] != 'RPAREN':
+                params.append(self.expect('IDENT'))
                 while self.match('COMMA'):
-                    params.append(self.expect('IDENT').value)
+                    params.append(self.expect('IDENT'))
             self.expect('RPAREN')
             body = self.block()
             return FuncDef(name, params, body)
 
-        if self.peek('RETURN'):
-            self.expect('RETURN')
+        if t == 'RETURN':
+            self.i += 1
             return Return(self.expr())
 
-        if self.peek('BREAK'):
-            self.expect('BREAK')
+        if t == 'BREAK':
+            self.i += 1
             return Break()
 
-        if self.peek('CONTINUE'):
-            self.expect('CONTINUE')
+        if t == 'CONTINUE':
+            self.i += 1
             return Continue()
 
         # Expression statement (e.g., function call)
@@ -228,372 +333,1345 @@ class Parser:
         return self.logical_or()
 
     def logical_or(self) -> Node:
+        types = self.types
         node = self.logical_and()
-        while self.peek('OR'):
-            self.expect('OR')
+        while types[self.i] == 'OR':
+            self.i += 1
             right = self.logical_and()
             node = LogicalOp('or', node, right)
         return node
 
     def logical_and(self) -> Node:
+        types = self.types
         node = self.logical_not()
-        while self.peek('AND'):
-            self.expect('AND')
+        while types[self.i] == 'AND':
+            self.i += 1
             right = self.logical_not()
             node = LogicalOp('and', node, right)
         return node
 
     def logical_not(self) -> Node:
-        if self.peek('NOT'):
-            self.expect('NOT')
+        if self.types[self.i] == 'NOT':
+            self.i += 1
             return LogicalOp('not', self.logical_not())
         return self.compare()
 
     def compare(self) -> Node:
+        types, values = self.types, self.values
         node = self.term()
-        while self.peek('CMP'):
-            op = self.expect('CMP').value
+        while types[i := self.i] == 'CMP':
+            op = values[i]
+            self.i = i + 1
             right = self.term()
             node = Compare(op, node, right)
         return node
 
     def term(self) -> Node:
+        types, values = self.types, self.values
         node = self.factor()
-        while self.peek('OP') and self.ts[self.i].value in ('+', '-'):
-            op = self.expect('OP').value
+        while types[i := self.i] in ('PLUS', 'MINUS'):
+            op = values[i]
+            self.i = i + 1
             right = self.factor()
-            node = BinOp(op, node, right)
+            node = self.binop(op, node, right)
         return node
 
     def factor(self) -> Node:
+        types, values = self.types, self.values
         node = self.power()
-        while self.peek('OP') and self.ts[self.i].value in ('*', '/', '%'):
-            op = self.expect('OP').value
+        while types[i := self.i] in ('STAR', 'SLASH', 'PERCENT'):
+            op = values[i]
+            self.i = i + 1
             right = self.power()
-            node = BinOp(op, node, right)
+            node = self.binop(op, node, right)
         return node
 
     def power(self) -> Node:
+        types = self.types
         node = self.unary()
-        while self.peek('OP') and self.ts[self.i].value == '^':
-            self.expect('OP')
+        while types[i := self.i] == 'CARET':
+            self.i = i + 1
             right = self.unary()
-            node = BinOp('^', node, right)
+            node = self.binop('^', node, right)
         return node
 
     def unary(self) -> Node:
-        if self.peek('OP') and self.ts[self.i].value == '-':
-            self.expect('OP')
-            return BinOp('*', Num(-1), self.unary())
+        i = self.i
+        if self.types[i] == 'MINUS':
+            self.i = i + 1
+            operand = self.unary()
+            if isinstance(operand, Num):
+                return Num(-operand.value)
+            return Neg(operand)
         return self.primary()
 
+    def binop(self, op: str, left: Node, right: Node) -> Node:
+        # Number literals on both sides fold right away (the Optimizer catches
+        # the rest); anything that raises is left for runtime to report.
+        if isinstance(left, Num) and isinstance(right, Num):
+            try:
+                return Num(BINOPS[op](left.value, right.value))
+            except (ArithmeticError, ValueError, TypeError):
+                pass
+        return BinOp(op, left, right)
+
     def primary(self) -> Node:
-        if self.peek('NUMBER'):
-            val = float(self.expect('NUMBER').value)
-            return Num(val)
-        if self.peek('STRING'):
-            raw = self.expect('STRING').value
-            s = bytes(raw[1:-1], 'utf-8').decode('unicode_escape')
-            return Str(s)
-        if self.peek('TRUE'):
-            self.expect('TRUE')
+        i = self.i
+        t = self.types[i]
+        if t == 'NUMBER' or t == 'STRING':
+            self.i = i + 1
+            return Num(self.values[i]) if t == 'NUMBER' else Str(self.values[i])
+        if t == 'TRUE':
+            self.i = i + 1
             return Bool(True)
-        if self.peek('FALSE'):
-            self.expect('FALSE')
+        if t == 'FALSE':
+            self.i = i + 1
             return Bool(False)
-        if self.peek('LBRACKET'):
-            self.expect('LBRACKET')
+        if t == 'LBRACKET':
+            self.i = i + 1
             elements = []
-            if not self.peek('RBRACKET'):
+            if self.types[self.i] != 'RBRACKET':
                 elements.append(self.expr())
                 while self.match('COMMA'):
                     elements.append(self.expr())
             self.expect('RBRACKET')
             return List_(elements)
-        if self.peek('DOLLAR'):
-            self.expect('DOLLAR')
-            name = self.expect('IDENT').value
+        if t == 'DOLLAR':
+            self.i = i + 1
+            name = self.expect('IDENT')
             node = Var(name)
             # Handle indexing
-            while self.peek('LBRACKET'):
-                self.expect('LBRACKET')
+            while self.match('LBRACKET'):
                 idx = self.expr()
                 self.expect('RBRACKET')
                 node = Index(node, idx)
             return node
-        if self.peek('IDENT'):
-            name = self.expect('IDENT').value
+        if t == 'IDENT':
+            self.i = i + 1
+            name = self.values[i]
             if self.match('LPAREN'):
                 args = []
-                if not self.peek('RPAREN'):
+                if self.types[self.i] != 'RPAREN':
                     args.append(self.expr())
                     while self.match('COMMA'):
                         args.append(self.expr())
                 self.expect('RPAREN')
                 return Call(name, args)
             return Var(name)  # allow bare ident inside functions
-        if self.match('LPAREN'):
+        if t == 'LPAREN':
+            self.i = i + 1
             e = self.expr()
             self.expect('RPAREN')
             return e
-        raise ParseError(f'Unexpected token {self.ts[self.i].type} at {self.ts[self.i].pos}')
+        raise ParseError(f'Unexpected token {t} at {self.positions[i]}')
 
 # ----------------------
-# Interpreter
+# Built-ins
 # ----------------------
 
-class ReturnSignal(Exception):
-    def __init__(self, value): self.value = value
+# built-in string functions
+def _len(obj):
+    return len(obj)
+def _upper(s):
+    return s.upper()
+def _lower(s):
+    return s.lower()
+def _substr(s, start, end=None):
+    if end is None:
+        return s[int(start):]
+    return s[int(start):int(end)]
 
-class BreakSignal(Exception):
-    pass
+# built-in list functions
+def _push(lst, item):
+    lst.append(item)
+    return lst
+def _pop(lst):
+    return lst.pop() if lst else None
+def _append(lst, item):
+    lst.append(item)
+    return lst
+
+# built-in utility functions
+def _input(prompt=""):
+    return input(prompt)
+def _type(obj):
+    if isinstance(obj, bool):
+        return "bool"
+    elif isinstance(obj, int) or isinstance(obj, float):
+        return "number"
+    elif isinstance(obj, str):
+        return "string"
+    elif isinstance(obj, list):
+        return "list"
+    else:
+        return "unknown"
+def _range(*args):
+    if len(args) == 1:
+        return list(range(int(args[0])))
+    elif len(args) == 2:
+        return list(range(int(args[0]), int(args[1])))
+    elif len(args) == 3:
+        return list(range(int(args[0]), int(args[1]), int(args[2])))
+    return []
+
+# Looked up by the Resolver; a built-in the program assigns to seeds its global slot.
+BUILTINS: Dict[str, Any] = {
+    # built-in constants
+    'PI': math.pi,
+    'E': math.e,
+
+    # built-in math functions
+    'sin': lambda x: math.sin(x),
+    'cos': lambda x: math.cos(x),
+    'tan': lambda x: math.tan(x),
+    'sqrt': lambda x: math.sqrt(x),
+    'abs': lambda x: abs(x),
+    'floor': lambda x: math.floor(x),
+    'ceil': lambda x: math.ceil(x),
+    'round': lambda x: round(x),
+    'min': lambda *args: min(args),
+    'max': lambda *args: max(args),
+    'pow': lambda x, y: x ** y,
+
+    'len': _len,
+    'upper': _upper,
+    'lower': _lower,
+    'substr': _substr,
+
+    'push': _push,
+    'pop': _pop,
+    'append': _append,
+
+    'input': _input,
+    'type': _type,
+    'range': _range,
+    'print': lambda *vals: print(*vals),
+}
+
+# Pure math built-ins worth caching when a program calls them on a few repeated values.
+MEMO_BUILTINS = ('sin', 'cos', 'tan', 'sqrt', 'floor', 'ceil', 'pow')
+
+def memoize_builtins(maxsize: int = 256):
+    """Wraps MEMO_BUILTINS in LRU caches (opt-in, --memo on the command line).
 
-class ContinueSignal(Exception):
+    Has to run before a program is optimized or compiled, since both look
+    the functions up once. typed=True keeps 2 and 2.0 apart, so results keep
+    the type they'd have had uncached.
+    """
+    global BUILTIN_VALUES
+    for name in MEMO_BUILTINS:
+        BUILTINS[name] = functools.lru_cache(maxsize=maxsize, typed=True)(BUILTINS[name])
+    BUILTIN_VALUES = tuple(BUILTINS.values())
+
+# ----------------------
+# Optimizer
+# ----------------------
+
+# Built-ins without side effects: calls on literal arguments fold at compile time.
+PURE_BUILTINS = {'sin', 'cos', 'tan', 'sqrt', 'abs', 'floor', 'ceil', 'round', 'min', 'max', 'pow'}
+# Built-in constants, folded unless the program rebinds them somewhere.
+CONSTANT_BUILTINS = ('PI', 'E')
+
+# Built-ins that mutate a list or talk to the outside world.
+IMPURE_BUILTINS = {'push', 'pop', 'append', 'input', 'print'}
+
+LITERALS = (Num, Str, Bool)
+
+def _literal(value: Any) -> Node:
+    if isinstance(value, bool): return Bool(value)
+    if isinstance(value, str): return Str(value)
+    return Num(value)
+
+def _all_bound_names(stmts: List[Node], out: set) -> set:
+    # every name assigned, loop-bound or taken as a parameter, at any depth
+    for s in stmts:
+        if isinstance(s, Assign):
+            out.add(s.name)
+        elif isinstance(s, ForLoop):
+            out.add(s.var)
+            _all_bound_names(s.body, out)
+        elif isinstance(s, FuncDef):
+            out.update(s.params)
+            _all_bound_names(s.body, out)
+        elif isinstance(s, If):
+            _all_bound_names(s.then, out)
+            if s.els is not None: _all_bound_names(s.els, out)
+        elif isinstance(s, While):
+            _all_bound_names(s.body, out)
+    return out
+
+def _walk(node: Node):
+    # the node and everything below it, in no particular order
+    yield node
+    for f in fields(node):
+        v = getattr(node, f.name)
+        if isinstance(v, Node):
+            yield from _walk(v)
+        elif isinstance(v, list):
+            for x in v:
+                if isinstance(x, Node): yield from _walk(x)
+
+class Optimizer:
+    """Post-parse pass: folds constant expressions.
+
+    Operators and pure built-in calls whose operands are all literals are
+    evaluated once here; anything that raises is left for runtime to report.
+    Loop-invariant parts of a while condition are hoisted into a temporary
+    assigned just before the loop.
+    """
+
+    def __init__(self):
+        self.user_funcs: set = set()
+        self.constants: Dict[str, Any] = {}
+        self.int_vars: frozenset = frozenset()  # range() loop variables in scope
+        self.taken: set = set()                 # names the program already uses
+        self.hoisted = 0
+
+    def optimize(self, prog: Program) -> Program:
+        self.user_funcs = _func_names(prog.body, set())
+        bound = _all_bound_names(prog.body, set())
+        self.constants = {n: BUILTINS[n] for n in CONSTANT_BUILTINS if n not in bound}
+        self.taken = bound | self.user_funcs | {n.name for n in _walk(prog) if isinstance(n, Var)}
+        prog.body = self.block(prog.body)
+        return prog
+
+    def block(self, stmts: List[Node]) -> List[Node]:
+        out = []
+        for s in stmts:
+            s = self.stmt(s)
+            if isinstance(s, While):
+                s.cond = self.hoist(s, out)
+            out.append(s)
+        return out
+
+    def calls_user_func(self, stmts: List[Node]) -> bool:
+        return any(isinstance(n, Call) and n.name in self.user_funcs
+                   for s in stmts for n in _walk(s))
+
+    # ---- loop-invariant code motion ----
+    # Only the condition is touched: it runs at least once before the body, so
+    # evaluating its invariant parts up front can't raise where the loop wouldn't.
+    def hoist(self, loop: While, out: List[Node]) -> Node:
+        # user code or a list mutator could change what a variable reads as
+        for n in _walk(loop):
+            if isinstance(n, Call) and (n.name in self.user_funcs or n.name in IMPURE_BUILTINS):
+                return loop.cond
+        return self.lift(loop.cond, _all_bound_names(loop.body, set()), out)
+
+    def lift(self, node: Node, writes: set, out: List[Node]) -> Node:
+        if self.invariant(node, writes):
+            if isinstance(node, (Var,) + LITERALS):
+                return node
+            while True:
+                name = f'__hoist_{self.hoisted}'
+                self.hoisted += 1
+                if name not in self.taken: break
+            out.append(Assign(name, node))
+            return Var(name)
+        if isinstance(node, (BinOp, Compare)):
+            node.left = self.lift(node.left, writes, out)
+            node.right = self.lift(node.right, writes, out)
+        elif isinstance(node, Neg):
+            node.expr = self.lift(node.expr, writes, out)
+        elif isinstance(node, LogicalOp):
+            # the right operand is short-circuited, so it may never run
+            node.left = self.lift(node.left, writes, out)
+        elif isinstance(node, (Index, IndexInt)):
+            node.obj = self.lift(node.obj, writes, out)
+            node.idx = self.lift(node.idx, writes, out)
+        elif isinstance(node, IndexConst):
+            node.obj = self.lift(node.obj, writes, out)
+        elif isinstance(node, Call):
+            node.args = [self.lift(a, writes, out) for a in node.args]
+        return node
+
+    def invariant(self, node: Node, writes: set) -> bool:
+        if isinstance(node, LITERALS):
+            return True
+        if isinstance(node, Var):
+            return node.name not in writes
+        if isinstance(node, (BinOp, Compare)):
+            return self.invariant(node.left, writes) and self.invariant(node.right, writes)
+        if isinstance(node, Neg):
+            return self.invariant(node.expr, writes)
+        if isinstance(node, Call):
+            return (node.name in PURE_BUILTINS and node.name not in self.user_funcs
+                    and all(self.invariant(a, writes) for a in node.args))
+        return False
+
+    def stmt(self, node: Node) -> Node:
+        if isinstance(node, Print):
+            node.args = [self.expr(a) for a in node.args]
+        elif isinstance(node, (Assign, Return)):
+            node.expr = self.expr(node.expr)
+        elif isinstance(node, If):
+            node.cond = self.expr(node.cond)
+            node.then = self.block(node.then)
+            if node.els is not None: node.els = self.block(node.els)
+        elif isinstance(node, While):
+            node.cond = self.expr(node.cond)
+            node.body = self.block(node.body)
+        elif isinstance(node, ForLoop):
+            node.iterable = self.expr(node.iterable)
+            outer = self.int_vars
+            it = node.iterable
+            # the variable only ever holds ints from range() unless the body rebinds
+            # it, or calls a user function that might
+            if (isinstance(it, Call) and it.name == 'range' and it.name not in self.user_funcs
+                    and node.var not in _all_bound_names(node.body, set())
+                    and not self.calls_user_func(node.body)):
+                self.int_vars = outer | {node.var}
+            else:
+                self.int_vars = outer - {node.var}
+            node.body = self.block(node.body)
+            self.int_vars = outer
+        elif isinstance(node, FuncDef):
+            outer, self.int_vars = self.int_vars, frozenset()
+            node.body = self.block(node.body)
+            self.int_vars = outer
+        elif not isinstance(node, (Break, Continue)):
+            return self.expr(node)
+        return node
+
+    def expr(self, node: Node) -> Node:
+        if isinstance(node, Var):
+            if node.name in self.constants:
+                return Num(self.constants[node.name])
+            return node
+        if isinstance(node, List_):
+            node.elements = [self.expr(e) for e in node.elements]
+            if all(isinstance(e, LITERALS) for e in node.elements):
+                node.literal = tuple(e.value for e in node.elements)
+            return node
+        if isinstance(node, Index):
+            node.obj = self.expr(node.obj)
+            node.idx = self.expr(node.idx)
+            idx = node.idx
+            if isinstance(idx, Num) and (isinstance(idx.value, int) or idx.value.is_integer()):
+                return IndexConst(node.obj, int(idx.value))
+            if isinstance(idx, Var) and idx.name in self.int_vars:
+                return IndexInt(node.obj, idx)
+            return node
+        if isinstance(node, (BinOp, Compare)):
+            node.left = self.expr(node.left)
+            node.right = self.expr(node.right)
+            if isinstance(node.left, LITERALS) and isinstance(node.right, LITERALS):
+                return self.fold(node, node.fn, node.left.value, node.right.value)
+            return node
+        if isinstance(node, Neg):
+            node.expr = self.expr(node.expr)
+            if isinstance(node.expr, LITERALS):
+                return self.fold(node, operator.neg, node.expr.value)
+            return node
+        if isinstance(node, LogicalOp):
+            node.left = self.expr(node.left)
+            if node.right is not None:
+                node.right = self.expr(node.right)
+            if not isinstance(node.left, LITERALS):
+                return node
+            if node.op == 'not':
+                return Bool(not node.left.value)
+            # a literal left operand decides which side the whole expression is
+            if bool(node.left.value) == (node.op == 'and'):
+                return node.right
+            return node.left
+        if isinstance(node, Call):
+            node.args = [self.expr(a) for a in node.args]
+            if (node.name in PURE_BUILTINS and node.name not in self.user_funcs
+                    and all(isinstance(a, Num) for a in node.args)):
+                return self.fold(node, BUILTINS[node.name], *[a.value for a in node.args])
+            return node
+        return node
+
+    def fold(self, node: Node, fn: Callable, *args: Any) -> Node:
+        try:
+            return _literal(fn(*args))
+        except (ArithmeticError, ValueError, TypeError):
+            return node
+
+# ----------------------
+# JIT (optional, needs numba)
+# ----------------------
+
+try:
+    import numba
+    from numba.core.errors import NumbaError
+    # ImportError covers a cached compile that can't find its module again;
+    # on ArithmeticError the interpreter reruns the call to raise its own error
+    JIT_ERRORS: Tuple[type, ...] = (NumbaError, ImportError, ArithmeticError)
+except ImportError:  # numba is optional: everything runs on the interpreter
+    numba = None
+    JIT_ERRORS = ()
+
+# Built-ins a numeric function may call, spelled as numba-supported Python.
+# Only ones that agree with the interpreter on every float: math.sqrt/sin/...
+# raise on bad input where numba returns nan, and floor/ceil/round give ints.
+JIT_BUILTINS = {'abs': 'abs', 'min': 'min', 'max': 'max'}
+
+class NotNumeric(Exception):
     pass
 
-class Environment:
+class TypeScanner:
+    """Finds top-level functions that only do float arithmetic and emits Python for them.
+
+    A function qualifies when its body uses nothing but numbers, booleans,
+    its own locals, abs/min/max, range() loops and calls to other qualifying
+    functions, and ends in a return. Every value it stores, passes or
+    returns must be a float: numba would turn an int into a float where the
+    interpreter keeps it, so range() variables may only meet floats, and
+    '^'/pow, whose results differ on negative bases, are left out. The
+    emitted source is plain Python with the same semantics, so numba can
+    compile it unchanged.
+    """
+
+    def __init__(self):
+        self.globals_bound: List[str] = []
+        self.user_funcs: set = set()
+        self.candidates: Dict[str, FuncDef] = {}
+        self.locals: Dict[str, str] = {}  # name -> 'float' or 'int'
+
+    def scan(self, prog: Program) -> Dict[str, str]:
+        self.globals_bound = _bound_names(prog.body, [])
+        self.user_funcs = _func_names(prog.body, set())
+        defs = [s for s in prog.body if isinstance(s, FuncDef)]
+        names = [f.name for f in defs]
+        nested: set = set()
+        for s in prog.body:
+            _func_names(s.body if isinstance(s, FuncDef) else [s], nested)
+        # a function defined twice (or also nested somewhere) has no single body to compile
+        self.candidates = {f.name: f for f in defs
+                           if names.count(f.name) == 1 and f.name not in nested}
+        sources: Dict[str, str] = {}
+        # dropping one function can disqualify its callers, so repeat until stable
+        changed = True
+        while changed:
+            changed = False
+            sources = {}
+            for name, f in list(self.candidates.items()):
+                try:
+                    sources[name] = self.function(f)
+                except NotNumeric:
+                    del self.candidates[name]
+                    changed = True
+        return sources
+
+    def function(self, f: FuncDef) -> str:
+        if not f.body or not isinstance(f.body[-1], Return):
+            raise NotNumeric(f.name)
+        loop_vars = _loop_vars(f.body, [])
+        self.locals = {p: 'float' for p in f.params}
+        for v in loop_vars:
+            if v in self.locals: raise NotNumeric(v)  # a param rebound as an int
+            self.locals[v] = 'int'
+        for n in _bound_names(f.body, []):
+            if n in self.globals_bound and n not in self.locals:
+                raise NotNumeric(n)  # would write a global
+            self.locals.setdefault(n, 'float')
+        params = ', '.join('v_' + p for p in f.params)
+        lines = [f'def f_{f.name}({params}):']
+        self.block(f.body, lines, '    ')
+        return '\n'.join(lines)
+
+    def block(self, stmts: List[Node], lines: List[str], indent: str):
+        if not stmts:
+            lines.append(indent + 'pass')
+        for s in stmts:
+            self.stmt(s, lines, indent)
+
+    def stmt(self, node: Node, lines: List[str], indent: str):
+        inner = indent + '    '
+        if isinstance(node, Assign):
+            if self.locals[node.name] != 'float': raise NotNumeric(node.name)
+            lines.append(f'{indent}v_{node.name} = {self.floating(node.expr)}')
+        elif isinstance(node, Return):
+            lines.append(f'{indent}return {self.floating(node.expr)}')
+        elif isinstance(node, If):
+            lines.append(f'{indent}if {self.expr(node.cond)[0]}:')
+            self.block(node.then, lines, inner)
+            if node.els is not None:
+                lines.append(indent + 'else:')
+                self.block(node.els, lines, inner)
+        elif isinstance(node, While):
+            lines.append(f'{indent}while {self.expr(node.cond)[0]}:')
+            self.block(node.body, lines, inner)
+        elif isinstance(node, ForLoop):
+            it = node.iterable
+            if not (isinstance(it, Call) and it.name == 'range' and it.name not in self.user_funcs
+                    and 1 <= len(it.args) <= 3):
+                raise NotNumeric('for')
+            bounds = ', '.join(f'int({self.number(a)[0]})' for a in it.args)
+            lines.append(f'{indent}for v_{node.var} in range({bounds}):')
+            self.block(node.body, lines, inner)
+        elif isinstance(node, Break):
+            lines.append(indent + 'break')
+        elif isinstance(node, Continue):
+            lines.append(indent + 'continue')
+        else:
+            raise NotNumeric(type(node).__name__)
+
+    def floating(self, node: Node) -> str:
+        code, kind = self.expr(node)
+        if kind != 'float': raise NotNumeric(kind)
+        return code
+
+    def number(self, node: Node) -> Tuple[str, str]:
+        code, kind = self.expr(node)
+        if kind == 'bool': raise NotNumeric(kind)
+        return code, kind
+
+    def expr(self, node: Node) -> Tuple[str, str]:
+        # -> (Python source, 'float' | 'int' | 'bool')
+        if isinstance(node, Bool):
+            return repr(node.value), 'bool'
+        if isinstance(node, Num):
+            # folding can leave a complex here, e.g. (-8) ^ 0.5
+            if type(node.value) not in (int, float): raise NotNumeric(type(node.value).__name__)
+            if not math.isfinite(node.value): raise NotNumeric('inf')
+            return repr(node.value), 'float' if isinstance(node.value, float) else 'int'
+        if isinstance(node, Var):
+            if node.name not in self.locals: raise NotNumeric(node.name)
+            return 'v_' + node.name, self.locals[node.name]
+        if isinstance(node, BinOp):
+            if node.op == '^': raise NotNumeric('^')
+            (left, lk), (right, rk) = self.number(node.left), self.number(node.right)
+            # int op int stays an int (and may outgrow numba's int64)
+            if lk == rk == 'int' and node.op != '/': raise NotNumeric('int')
+            return f'({left} {node.op} {right})', 'float'
+        if isinstance(node, Compare):
+            (left, _), (right, _) = self.number(node.left), self.number(node.right)
+            return f'({left} {node.op} {right})', 'bool'
+        if isinstance(node, Neg):
+            code, kind = self.number(node.expr)
+            return f'(-{code})', kind
+        if isinstance(node, LogicalOp):
+            # and/or hand back an operand, so both have to be booleans already
+            left, lk = self.expr(node.left)
+            if node.op == 'not':
+                return f'(not {left})', 'bool'
+            right, rk = self.expr(node.right)
+            if lk != 'bool' or rk != 'bool': raise NotNumeric(node.op)
+            return f'({left} {node.op} {right})', 'bool'
+        if isinstance(node, Call):
+            args = [self.floating(a) for a in node.args]
+            if node.name in self.candidates:
+                return f'f_{node.name}({", ".join(args)})', 'float'
+            if node.name in self.user_funcs:
+                raise NotNumeric(node.name)
+            if node.name in JIT_BUILTINS and args:
+                return f'{JIT_BUILTINS[node.name]}({", ".join(args)})', 'float'
+        raise NotNumeric(type(node).__name__)
+
+def _jit_cache_dir() -> str:
+    # Per-user: a shared temp directory would let another user plant the
+    # module we're about to import.
+    import os
+    base = os.environ.get('LOCALAPPDATA') if os.name == 'nt' else None
+    base = base or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    folder = os.path.join(base, 'djerba', 'jit')
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid'):
+        st = os.stat(folder)
+        if st.st_uid != os.getuid() or st.st_mode & 0o022:
+            raise OSError(f'{folder} is writable by other users')
+    return folder
+
+def _load_jit_module(source: str):
+    # numba can only cache functions that live in a real file, so the
+    # generated module is written out under a name derived from its source.
+    import hashlib, importlib.util, os, tempfile
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    folder = _jit_cache_dir()
+    path = os.path.join(folder, f'djerba_jit_{digest}.py')
+    try:
+        with open(path, encoding='utf-8') as fh:
+            current = fh.read() == source
+    except FileNotFoundError:
+        current = False
+    if not current:
+        # written next to its final name and renamed, so no one sees half a file
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                fh.write(source)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp): os.unlink(tmp)
+            raise
+    spec = importlib.util.spec_from_file_location(f'djerba_jit_{digest}', path)
+    module = importlib.util.module_from_spec(spec)
+    # numba's cache pickles a reference to the module, which later runs
+    # resolve through sys.modules
+    sys.modules[spec.name] = module
+    try:
+        # run the source we generated, not whatever the file holds by now
+        exec(compile(source, path, 'exec'), module.__dict__)
+    except BaseException:
+        del sys.modules[spec.name]
+        raise
+    return module
+
+def attach_jit(prog: Program) -> Program:
+    """Compiles numeric-only functions with numba and sets FuncDef.jit_impl.
+
+    Does nothing when numba isn't installed. Compilation itself is lazy:
+    numba types a function on its first call, and a function that fails to
+    type there is dropped back to the interpreter (see _compile_call).
+    """
+    if numba is None:
+        return prog
+    try:  # any failure here just leaves the program interpreted
+        sources = TypeScanner().scan(prog)
+        if not sources:
+            return prog
+        header = 'import numba\n'
+        body = '\n\n'.join('@numba.njit(cache=True)\n' + src for src in sources.values())
+        module = _load_jit_module(header + '\n' + body + '\n')
+    except Exception:
+        return prog
+    for s in prog.body:
+        if isinstance(s, FuncDef) and s.name in sources:
+            s.jit_impl = getattr(module, 'f_' + s.name)
+    return prog
+
+# ----------------------
+# Resolver
+# ----------------------
+
+_UNSET = object()  # value of a slot that was never assigned
+
+BUILTIN_NAMES = tuple(BUILTINS)
+BUILTIN_VALUES = tuple(BUILTINS.values())
+BUILTIN_IDS = {name: i for i, name in enumerate(BUILTIN_NAMES)}
+
+# Resolved forms of Var / Assign: a slot in the running function's frame
+# (or the global frame, at the top level) ...
+@dataclass(slots=True)
+class VarSlot(Node): slot: int; name: str
+@dataclass(slots=True)
+class AssignSlot(Node): slot: int; expr: Node; name: str
+# ... or, from inside a function, a slot in the global frame.
+@dataclass(slots=True)
+class GlobalSlot(Node): slot: int; name: str
+@dataclass(slots=True)
+class AssignGlobal(Node): slot: int; expr: Node; name: str
+# A nested function reading a local of a function around it: `depth` frames up.
+@dataclass(slots=True)
+class UpvalSlot(Node): depth: int; slot: int; name: str
+@dataclass(slots=True)
+class BuiltinRef(Node): index: int
+@dataclass(slots=True)
+class BuiltinCall(Node): fn: Callable; args: List[Node]; name: str
+
+class Scope:
     def __init__(self, parent=None):
         self.parent = parent
-        self.vars: Dict[str, Any] = {}
-        self.funcs: Dict[str, FuncDef] = {}
+        self.depth = parent.depth + 1 if parent else 0
+        self.names: Dict[str, int] = {}
+
+    def declare(self, name: str) -> int:
+        if name not in self.names:
+            self.names[name] = len(self.names)
+        return self.names[name]
 
-    def get(self, name: str):
-        if name in self.vars: return self.vars[name]
-        if self.parent: return self.parent.get(name)
-        raise NameError(f'Undefined variable {name}')
+    def lookup(self, name: str) -> Optional[Tuple[int, int]]:
+        scope, depth = self, 0
+        while scope:
+            if name in scope.names: return depth, scope.names[name]
+            scope, depth = scope.parent, depth + 1
+        return None
+
+def _bound_names(stmts: List[Node], out: List[str]) -> List[str]:
+    # names assigned or loop-bound in a body, not descending into FuncDefs
+    for s in stmts:
+        if isinstance(s, (Assign, ForLoop)):
+            name = s.name if isinstance(s, Assign) else s.var
+            if name not in out: out.append(name)
+        if isinstance(s, If):
+            _bound_names(s.then, out)
+            if s.els is not None: _bound_names(s.els, out)
+        elif isinstance(s, (While, ForLoop)):
+            _bound_names(s.body, out)
+    return out
 
-    def set(self, name: str, value: Any):
-        # assign into nearest existing scope, else current
-        if name in self.vars:
-            self.vars[name] = value; return
-        if self.parent and name in self.parent.vars:
-            self.parent.set(name, value); return
-        self.vars[name] = value
+def _func_names(stmts: List[Node], out: set) -> set:
+    for s in stmts:
+        if isinstance(s, FuncDef):
+            out.add(s.name)
+            _func_names(s.body, out)
+        elif isinstance(s, If):
+            _func_names(s.then, out)
+            if s.els is not None: _func_names(s.els, out)
+        elif isinstance(s, (While, ForLoop)):
+            _func_names(s.body, out)
+    return out
+
+def _loop_vars(stmts: List[Node], out: List[str]) -> List[str]:
+    # for-loop variables at any depth, not descending into FuncDefs; inside
+    # a function they're always locals, whatever the top level binds
+    for s in stmts:
+        if isinstance(s, ForLoop):
+            if s.var not in out: out.append(s.var)
+            _loop_vars(s.body, out)
+        elif isinstance(s, If):
+            _loop_vars(s.then, out)
+            if s.els is not None: _loop_vars(s.els, out)
+        elif isinstance(s, While):
+            _loop_vars(s.body, out)
+    return out
+
+class CompileError(Exception): pass
+
+class Resolver:
+    """Post-parse pass that gives every variable a slot address.
+
+    Only functions get their own Scope, hanging off the scope of the function
+    they're defined in (or the global one); blocks share the scope they
+    appear in. A nested function can read its enclosing functions' locals,
+    but assigning one binds a local of its own. Everything is decided up front, so it
+    can't depend on the order functions appear in: the globals are the names
+    bound at the top level, plus any built-in the program assigns to, and a
+    function's locals are its parameters, loop variables and any other name
+    it binds that isn't global. A read that resolves nowhere is a built-in
+    or, failing that, a global that is never assigned.
+    """
+
+    def __init__(self):
+        self.root = Scope()
+        self.user_funcs: set = set()
+        self.callers: Dict[str, List[Call]] = {}  # resolved Calls of each stable function
+        self.loop_depth = 0  # loops around the statement, within its function
+        # global slots for names only ever read; kept out of root so bind() can't see them
+        self.unresolved: Dict[str, int] = {}
+
+    def resolve(self, prog: Program) -> Program:
+        self.user_funcs = _func_names(prog.body, set())
+        # Stable: defined once, at the top level and nowhere else. Once that
+        # definition has run, every call of the name means the same FuncDef.
+        top = [s.name for s in prog.body if isinstance(s, FuncDef)]
+        nested: set = set()
+        for s in prog.body:
+            _func_names(s.body if isinstance(s, FuncDef) else [s], nested)
+        self.callers = {n: [] for n in top if top.count(n) == 1 and n not in nested}
+        for name in _bound_names(prog.body, []):
+            self.root.declare(name)
+        assigned = _all_bound_names(prog.body, set())
+        for name in BUILTINS:
+            if name in assigned: self.root.declare(name)
+        body = [self.stmt(s, self.root) for s in prog.body]
+        # running the definition binds every call to it, so calls never look it up
+        for s in body:
+            if isinstance(s, FuncDef) and s.name in self.callers:
+                s.callers = self.callers[s.name]
+        return Program(body, len(self.root.names) + len(self.unresolved))
+
+    def block(self, stmts: List[Node], scope: Scope) -> List[Node]:
+        return [self.stmt(s, scope) for s in stmts]
+
+    def bind(self, name: str, scope: Scope) -> Tuple[int, bool]:
+        # -> (slot, is_global) for a name being assigned in scope; every
+        # binding was declared up front, in the function or in root
+        if scope is not self.root and name in scope.names:
+            return scope.names[name], False
+        return self.root.names[name], True
+
+    def stmt(self, node: Node, scope: Scope) -> Node:
+        if isinstance(node, Print):
+            return Print([self.expr(a, scope) for a in node.args])
+        if isinstance(node, Assign):
+            expr = self.expr(node.expr, scope)
+            slot, is_global = self.bind(node.name, scope)
+            if is_global:
+                return AssignGlobal(slot, expr, node.name)
+            return AssignSlot(slot, expr, node.name)
+        if isinstance(node, If):
+            cond = self.expr(node.cond, scope)
+            then = self.block(node.then, scope)
+            els = None if node.els is None else self.block(node.els, scope)
+            return If(cond, then, els)
+        if isinstance(node, While):
+            cond = self.expr(node.cond, scope)
+            return While(cond, self.loop_body(node.body, scope))
+        if isinstance(node, ForLoop):
+            iterable = self.expr(node.iterable, scope)
+            slot, is_global = self.bind(node.var, scope)
+            return ForLoop(node.var, iterable, self.loop_body(node.body, scope), slot, is_global)
+        if isinstance(node, FuncDef):
+            fscope = Scope(scope)
+            for p in node.params:  # params are slots 0..n-1
+                fscope.declare(p)
+            for v in _loop_vars(node.body, []):
+                fscope.declare(v)
+            for n in _bound_names(node.body, []):
+                if n not in self.root.names: fscope.declare(n)
+            outer, self.loop_depth = self.loop_depth, 0
+            body = self.block(node.body, fscope)
+            self.loop_depth = outer
+            return FuncDef(node.name, node.params, body, len(fscope.names), jit_impl=node.jit_impl)
+        if isinstance(node, Return):
+            return Return(self.expr(node.expr, scope))
+        if isinstance(node, (Break, Continue)):
+            # a stray one would otherwise quietly end the block or function it's in
+            if not self.loop_depth:
+                raise CompileError(f'{type(node).__name__.lower()} outside loop')
+            return node
+        return self.expr(node, scope)
+
+    def loop_body(self, stmts: List[Node], scope: Scope) -> List[Node]:
+        self.loop_depth += 1
+        body = self.block(stmts, scope)
+        self.loop_depth -= 1
+        return body
+
+    def expr(self, node: Node, scope: Scope) -> Node:
+        if isinstance(node, (Num, Str, Bool)):
+            return node
+        if isinstance(node, List_):
+            return List_([self.expr(e, scope) for e in node.elements], node.literal)
+        if isinstance(node, Var):
+            found = scope.lookup(node.name)
+            if found:
+                depth, slot = found
+                if depth == scope.depth:
+                    return GlobalSlot(slot, node.name)
+                if depth:
+                    return UpvalSlot(depth, slot, node.name)
+                return VarSlot(slot, node.name)
+            if node.name in BUILTIN_IDS:
+                return BuiltinRef(BUILTIN_IDS[node.name])
+            slot = self.unresolved.get(node.name)
+            if slot is None:
+                # root is complete by now, so these slots come after its names
+                slot = self.unresolved[node.name] = len(self.root.names) + len(self.unresolved)
+            return GlobalSlot(slot, node.name)
+        if isinstance(node, BinOp):
+            return BinOp(node.op, self.expr(node.left, scope), self.expr(node.right, scope))
+        if isinstance(node, Compare):
+            return Compare(node.op, self.expr(node.left, scope), self.expr(node.right, scope))
+        if isinstance(node, Neg):
+            return Neg(self.expr(node.expr, scope))
+        if isinstance(node, LogicalOp):
+            right = None if node.right is None else self.expr(node.right, scope)
+            return LogicalOp(node.op, self.expr(node.left, scope), right)
+        if isinstance(node, Index):
+            return Index(self.expr(node.obj, scope), self.expr(node.idx, scope))
+        if isinstance(node, IndexConst):
+            return IndexConst(self.expr(node.obj, scope), node.idx)
+        if isinstance(node, IndexInt):
+            return IndexInt(self.expr(node.obj, scope), self.expr(node.idx, scope))
+        if isinstance(node, Call):
+            args = [self.expr(a, scope) for a in node.args]
+            if node.name not in self.user_funcs and node.name in BUILTINS:
+                return BuiltinCall(BUILTINS[node.name], args, node.name)
+            call = Call(node.name, args)
+            if node.name in self.callers:
+                self.callers[node.name].append(call)
+            return call
+        raise RuntimeError(f'Unhandled expr node: {node}')
+
+# ----------------------
+# Interpreter
+# ----------------------
+
+# Statement results are (status, value) pairs; value is only set for ST_RETURN.
+ST_NORMAL, ST_BREAK, ST_CONTINUE, ST_RETURN = range(4)
+_NORMAL = (ST_NORMAL, None)
+_BREAK = (ST_BREAK, None)
+_CONTINUE = (ST_CONTINUE, None)
+
+class Environment:
+    def __init__(self, parent=None, size: int = 0):
+        self.parent = parent
+        self.globals = parent.globals if parent else self
+        self.slots: List[Any] = [_UNSET] * size
+        self.funcs: Dict[str, FuncDef] = {}
 
     def define_func(self, f: FuncDef):
         self.funcs[f.name] = f
 
-    def get_func(self, name: str):
-        if name in self.funcs: return self.funcs[name]
-        if self.parent: return self.parent.get_func(name)
+    def get_func(self, name: str) -> Tuple[FuncDef, 'Environment']:
+        # -> (the function, the frame that defined it)
+        env = self
+        while env is not None:
+            f = env.funcs.get(name)
+            if f is not None: return f, env
+            env = env.parent
         raise NameError(f'Undefined function {name}()')
 
 def eval_program(ast: Program):
-    env = Environment()
-    # built-in constants
-    env.vars['PI'] = math.pi
-    env.vars['E'] = math.e
-    
-    # built-in math functions
-    env.vars['sin'] = lambda x: math.sin(x)
-    env.vars['cos'] = lambda x: math.cos(x)
-    env.vars['tan'] = lambda x: math.tan(x)
-    env.vars['sqrt'] = lambda x: math.sqrt(x)
-    env.vars['abs'] = lambda x: abs(x)
-    env.vars['floor'] = lambda x: math.floor(x)
-    env.vars['ceil'] = lambda x: math.ceil(x)
-    env.vars['round'] = lambda x: round(x)
-    env.vars['min'] = lambda *args: min(args)
-    env.vars['max'] = lambda *args: max(args)
-    env.vars['pow'] = lambda x, y: x ** y
-    
-    # built-in string functions
-    def _len(obj):
-        return len(obj)
-    def _upper(s):
-        return s.upper()
-    def _lower(s):
-        return s.lower()
-    def _substr(s, start, end=None):
-        if end is None:
-            return s[int(start):]
-        return s[int(start):int(end)]
-    
-    env.vars['len'] = _len
-    env.vars['upper'] = _upper
-    env.vars['lower'] = _lower
-    env.vars['substr'] = _substr
-    
-    # built-in list functions
-    def _push(lst, item):
-        lst.append(item)
-        return lst
-    def _pop(lst):
-        return lst.pop() if lst else None
-    def _append(lst, item):
-        lst.append(item)
-        return lst
-    
-    env.vars['push'] = _push
-    env.vars['pop'] = _pop
-    env.vars['append'] = _append
-    
-    # built-in utility functions
-    def _input(prompt=""):
-        return input(prompt)
-    def _type(obj):
-        if isinstance(obj, bool):
-            return "bool"
-        elif isinstance(obj, int) or isinstance(obj, float):
-            return "number"
-        elif isinstance(obj, str):
-            return "string"
-        elif isinstance(obj, list):
-            return "list"
-        else:
-            return "unknown"
-    def _range(*args):
-        if len(args) == 1:
-            return list(range(int(args[0])))
-        elif len(args) == 2:
-            return list(range(int(args[0]), int(args[1])))
-        elif len(args) == 3:
-            return list(range(int(args[0]), int(args[1]), int(args[2])))
-        return []
-    
-    env.vars['input'] = _input
-    env.vars['type'] = _type
-    env.vars['range'] = _range
-    env.vars['print'] = lambda *vals: print(*vals)
-    
-    run_block(ast.body, env)
-
-def run_block(stmts: List[Node], env: Environment):
-    for s in stmts:
-        eval_stmt(s, env)
-
-def eval_stmt(node: Node, env: Environment):
-    if isinstance(node, Print):
-        vals = [eval_expr(a, env) for a in node.args]
-        print(*vals)
-        return
-    if isinstance(node, Assign):
-        env.set(node.name, eval_expr(node.expr, env)); return
-    if isinstance(node, If):
-        if truthy(eval_expr(node.cond, env)):
-            run_block(node.then, Environment(env))
-        elif node.els is not None:
-            run_block(node.els, Environment(env))
-        return
-    if isinstance(node, While):
-        while truthy(eval_expr(node.cond, env)):
-            try:
-                run_block(node.body, Environment(env))
-            except ContinueSignal:
-                continue
-            except BreakSignal:
+    resolver = Resolver()
+    prog = resolver.resolve(ast)
+    env = Environment(None, prog.nslots)
+    # a built-in the program assigns to starts out holding the built-in
+    for name, slot in resolver.root.names.items():
+        if name in BUILTINS: env.slots[slot] = BUILTINS[name]
+    compile_block(prog.body)(env)
+
+# The resolved AST is compiled once into nested closures: each node becomes a
+# Python function of the Environment that calls its children's closures
+# directly, so nothing is dispatched on node type while the program runs.
+# Statement closures return (status, value) pairs; expression closures return values.
+
+def compile_block(stmts: List[Node]) -> Callable:
+    fns = [compile_stmt(s) for s in stmts]
+    if not fns:
+        return lambda env: _NORMAL
+    if len(fns) == 1:
+        return fns[0]
+    def run_block(env):
+        for fn in fns:
+            res = fn(env)
+            if res is not _NORMAL:
+                return res
+        return _NORMAL
+    return run_block
+
+# Statements: one compile function per node type, looked up by exact type in compile_stmt.
+
+def _compile_print(node: Print):
+    args = [compile_expr(a) for a in node.args]
+    def run(env):
+        print(*[a(env) for a in args])
+        return _NORMAL
+    return run
+
+def _compile_assign(node: AssignSlot):
+    expr = compile_expr(node.expr)
+    slot = node.slot
+    def run(env):
+        env.slots[slot] = expr(env)
+        return _NORMAL
+    return run
+
+def _compile_assign_global(node: AssignGlobal):
+    expr = compile_expr(node.expr)
+    slot = node.slot
+    def run(env):
+        env.globals.slots[slot] = expr(env)
+        return _NORMAL
+    return run
+
+def _compile_if(node: If):
+    cond = compile_expr(node.cond)
+    then = compile_block(node.then)
+    els = None if node.els is None else compile_block(node.els)
+    def run(env):
+        if cond(env):
+            return then(env)
+        elif els is not None:
+            return els(env)
+        return _NORMAL
+    return run
+
+def _compile_while(node: While):
+    cond, body = compile_expr(node.cond), compile_block(node.body)
+    def run(env):
+        while cond(env):
+            res = body(env)
+            if res[0] == ST_BREAK:
                 break
-            except ReturnSignal:  
-                pass
-        return
-    if isinstance(node, ForLoop):
-        iterable = eval_expr(node.iterable, env)
-        if not hasattr(iterable, '__iter__'):
-            raise TypeError(f'Cannot iterate over {type(iterable)}')
-        for item in iterable:
-            child = Environment(env)
-            child.vars[node.var] = item
-            try:
-                run_block(node.body, child)
-            except ContinueSignal:
-                continue
-            except BreakSignal:
+            if res[0] == ST_RETURN:
+                return res
+        return _NORMAL
+    return run
+
+def _compile_for(node: ForLoop):
+    iterable, body = compile_expr(node.iterable), compile_block(node.body)
+    slot, is_global = node.slot, node.is_global
+    def run(env):
+        seq = iterable(env)
+        try:
+            it = iter(seq)
+        except TypeError:
+            raise TypeError(f'Cannot iterate over {type(seq)}') from None
+        slots = env.globals.slots if is_global else env.slots
+        for item in it:
+            slots[slot] = item
+            res = body(env)
+            if res[0] == ST_BREAK:
                 break
-        return
-    if isinstance(node, FuncDef):
-        env.define_func(node); return
-    if isinstance(node, Return):
-        val = eval_expr(node.expr, env)
-        raise ReturnSignal(val)
-    if isinstance(node, Break):
-        raise BreakSignal()
-    if isinstance(node, Continue):
-        raise ContinueSignal()
+            if res[0] == ST_RETURN:
+                return res
+        return _NORMAL
+    return run
+
+def _compile_funcdef(node: FuncDef):
+    # the body is compiled by its first call (see _compile_call)
+    def run(env):
+        env.define_func(node)
+        for call in node.callers:
+            call.func = node
+        return _NORMAL
+    return run
+
+def _compile_return(node: Return):
+    expr = compile_expr(node.expr)
+    return lambda env: (ST_RETURN, expr(env))
+
+def _compile_break(node: Break):
+    return lambda env: _BREAK
+
+def _compile_continue(node: Continue):
+    return lambda env: _CONTINUE
+
+def _compile_expr_stmt(node: Node):
     # Expression-only statement
-    eval_expr(node, env)
+    expr = compile_expr(node)
+    def run(env):
+        expr(env)
+        return _NORMAL
+    return run
 
-def truthy(v): return bool(v)
+_STMT_COMPILERS = {
+    Print: _compile_print,
+    AssignSlot: _compile_assign,
+    AssignGlobal: _compile_assign_global,
+    If: _compile_if,
+    While: _compile_while,
+    ForLoop: _compile_for,
+    FuncDef: _compile_funcdef,
+    Return: _compile_return,
+    Break: _compile_break,
+    Continue: _compile_continue,
+}
 
-def eval_expr(node: Node, env: Environment):
-    if isinstance(node, Num): return node.value
-    if isinstance(node, Str): return node.value
-    if isinstance(node, Bool): return node.value
-    if isinstance(node, List_): return [eval_expr(e, env) for e in node.elements]
-    if isinstance(node, Var):
-        # allow bare identifiers as local vars or params
+def compile_stmt(node: Node) -> Callable:
+    return _STMT_COMPILERS.get(type(node), _compile_expr_stmt)(node)
+
+# Expressions: same scheme as statements.
+
+def _compile_const(node: Node):
+    value = node.value
+    return lambda env: value
+
+def _compile_list(node: List_):
+    literal = node.literal
+    if literal is not None:
+        return lambda env: list(literal)  # lists are mutable: every evaluation gets a fresh one
+    elements = [compile_expr(e) for e in node.elements]
+    return lambda env: [e(env) for e in elements]
+
+def _compile_var(node: VarSlot):
+    slot, name = node.slot, node.name
+    def var(env):
+        v = env.slots[slot]
+        if v is _UNSET:
+            raise NameError(f'Undefined variable {name}')
+        return v
+    return var
+
+def _compile_global(node: GlobalSlot):
+    slot, name = node.slot, node.name
+    def var(env):
+        v = env.globals.slots[slot]
+        if v is _UNSET:
+            raise NameError(f'Undefined variable {name}')
+        return v
+    return var
+
+def _compile_upval(node: UpvalSlot):
+    # each frame's parent is the frame its function was defined in, so the
+    # enclosing function's frame is `depth` parents up
+    depth, slot, name = node.depth, node.slot, node.name
+    def var(env):
+        for _ in range(depth):
+            env = env.parent
+        v = env.slots[slot]
+        if v is _UNSET:
+            raise NameError(f'Undefined variable {name}')
+        return v
+    return var
+
+def _compile_builtin_ref(node: BuiltinRef):
+    value = BUILTIN_VALUES[node.index]
+    return lambda env: value
+
+# One closure shape per operator, so the operation runs as a plain Python
+# operator rather than a call through node.fn.
+_BINOP_CLOSURES: Dict[str, Callable] = {
+    '+': lambda l, r: lambda env: l(env) + r(env),
+    '-': lambda l, r: lambda env: l(env) - r(env),
+    '*': lambda l, r: lambda env: l(env) * r(env),
+    '/': lambda l, r: lambda env: l(env) / r(env),
+    '%': lambda l, r: lambda env: l(env) % r(env),
+    '^': lambda l, r: lambda env: l(env) ** r(env),
+    '==': lambda l, r: lambda env: l(env) == r(env),
+    '!=': lambda l, r: lambda env: l(env) != r(env),
+    '<': lambda l, r: lambda env: l(env) < r(env),
+    '>': lambda l, r: lambda env: l(env) > r(env),
+    '<=': lambda l, r: lambda env: l(env) <= r(env),
+    '>=': lambda l, r: lambda env: l(env) >= r(env),
+}
+
+# Same, for a literal right operand (`$i < 10`, `$n % 2`): the constant is
+# captured by the closure instead of being produced by a call.
+_BINOP_CONST_CLOSURES: Dict[str, Callable] = {
+    '+': lambda l, c: lambda env: l(env) + c,
+    '-': lambda l, c: lambda env: l(env) - c,
+    '*': lambda l, c: lambda env: l(env) * c,
+    '/': lambda l, c: lambda env: l(env) / c,
+    '%': lambda l, c: lambda env: l(env) % c,
+    '^': lambda l, c: lambda env: l(env) ** c,
+    '==': lambda l, c: lambda env: l(env) == c,
+    '!=': lambda l, c: lambda env: l(env) != c,
+    '<': lambda l, c: lambda env: l(env) < c,
+    '>': lambda l, c: lambda env: l(env) > c,
+    '<=': lambda l, c: lambda env: l(env) <= c,
+    '>=': lambda l, c: lambda env: l(env) >= c,
+}
+
+def _compile_binop(node: BinOp):
+    if isinstance(node.right, LITERALS):
+        return _BINOP_CONST_CLOSURES[node.op](compile_expr(node.left), node.right.value)
+    if isinstance(node.left, LITERALS):
+        fn, c, right = node.fn, node.left.value, compile_expr(node.right)
+        return lambda env: fn(c, right(env))
+    return _BINOP_CLOSURES[node.op](compile_expr(node.left), compile_expr(node.right))
+
+def _compile_neg(node: Neg):
+    expr = compile_expr(node.expr)
+    return lambda env: -expr(env)
+
+def _compile_logical(node: LogicalOp):
+    left = compile_expr(node.left)
+    if node.op == 'not':
+        return lambda env: not left(env)
+    right = compile_expr(node.right)
+    # like Python, `and`/`or` short-circuit and yield the deciding operand
+    if node.op == 'and':
+        return lambda env: left(env) and right(env)
+    if node.op == 'or':
+        return lambda env: left(env) or right(env)
+    raise RuntimeError(f'Unknown logical op {node.op}')
+
+def _compile_index(node: Index):
+    obj, idx = compile_expr(node.obj), compile_expr(node.idx)
+    def index(env):
+        o = obj(env)
+        i = idx(env)
+        if isinstance(o, (list, str)):
+            return o[int(i)]
+        raise TypeError(f'Cannot index {type(o)}')
+    return index
+
+def _compile_index_const(node: IndexConst):
+    obj, i = compile_expr(node.obj), node.idx
+    def index(env):
+        o = obj(env)
         try:
-            return env.get(node.name)
-        except NameError:
-            raise
-    if isinstance(node, BinOp):
-        l = eval_expr(node.left, env); r = eval_expr(node.right, env)
-        if node.op == '+': return l + r
-        if node.op == '-': return l - r
-        if node.op == '*': return l * r
-        if node.op == '/': return l / r
-        if node.op == '%': return l % r
-        if node.op == '^': return l ** r
-        raise RuntimeError(f'Unknown op {node.op}')
-    if isinstance(node, Compare):
-        l = eval_expr(node.left, env); r = eval_expr(node.right, env)
-        if node.op == '==': return l == r
-        if node.op == '!=': return l != r
-        if node.op == '<':  return l <  r
-        if node.op == '>':  return l >  r
-        if node.op == '<=': return l <= r
-        if node.op == '>=': return l >= r
-        raise RuntimeError(f'Unknown cmp {node.op}')
-    if isinstance(node, LogicalOp):
-        if node.op == 'not':
-            return not truthy(eval_expr(node.left, env))
-        l = eval_expr(node.left, env)
-        if node.op == 'and':
-            return truthy(l) and truthy(eval_expr(node.right, env))
-        if node.op == 'or':
-            return truthy(l) or truthy(eval_expr(node.right, env))
-        raise RuntimeError(f'Unknown logical op {node.op}')
-    if isinstance(node, Index):
-        obj = eval_expr(node.obj, env)
-        idx = eval_expr(node.idx, env)
-        if isinstance(obj, (list, str)):
-            return obj[int(idx)]
-        raise TypeError(f'Cannot index {type(obj)}')
-    if isinstance(node, Call):
-        # user-defined
+            return o[i]
+        except TypeError:
+            raise TypeError(f'Cannot index {type(o)}') from None
+    return index
+
+def _compile_index_int(node: IndexInt):
+    obj, idx = compile_expr(node.obj), compile_expr(node.idx)
+    def index(env):
+        o = obj(env)
         try:
-            f = env.get_func(node.name)
-            if len(node.args) != len(f.params):
-                raise TypeError(f'{f.name} expects {len(f.params)} args, got {len(node.args)}')
-            child = Environment(env)
-            for name, arg in zip(f.params, node.args):
-                child.vars[name] = eval_expr(arg, env)
+            return o[idx(env)]
+        except TypeError:
+            raise TypeError(f'Cannot index {type(o)}') from None
+    return index
+
+def _compile_builtin_call(node: BuiltinCall):
+    fn = node.fn
+    args = [compile_expr(a) for a in node.args]
+    if len(args) == 1:
+        a0 = args[0]
+        return lambda env: fn(a0(env))
+    return lambda env: fn(*[a(env) for a in args])
+
+def _compile_call(node: Call):
+    args = [compile_expr(a) for a in node.args]
+    nargs = len(args)
+    def call(env):
+        vals = [a(env) for a in args]
+        f = node.func
+        if f is None:
+            f, outer = env.get_func(node.name)
+        else:
+            outer = env.globals  # bound calls only ever reach top-level functions
+        if nargs != len(f.params):
+            raise TypeError(f'{f.name} expects {len(f.params)} args, got {nargs}')
+        # int arguments stay interpreted: numba would hand back floats where Djerba keeps ints
+        if f.jit_impl is not None and all(type(v) is float for v in vals):
             try:
-                run_block(f.body, child)
-                return None
-            except ReturnSignal as rs:
-                return rs.value
-        except NameError:
-            # try a built-in callable in vars
-            fn = env.vars.get(node.name)
-            if callable(fn):
-                args = [eval_expr(a, env) for a in node.args]
-                return fn(*args)
-            raise
-    raise RuntimeError(f'Unhandled expr node: {node}')
+                return f.jit_impl(*vals)
+            except JIT_ERRORS:
+                f.jit_impl = None  # failed to type; keep interpreting this function
+        # The argument list becomes the frame's slots: params are slots 0..n-1.
+        if f.nslots > nargs:
+            vals.extend([_UNSET] * (f.nslots - nargs))
+        # Frames can't outlive their call, so finished ones are kept for reuse.
+        # A frame's parent is the one the function was defined in, so the
+        # functions it defines stay visible to it, recursion included.
+        pool = f.frame_pool
+        if pool:
+            child = pool.pop()
+            child.parent = outer
+            if child.funcs: child.funcs.clear()
+        else:
+            child = Environment(outer)
+        child.slots = vals
+        body = f.compiled
+        if body is None:
+            body = f.compiled = compile_block(f.body)
+        status, value = body(child)
+        pool.append(child)
+        return value if status == ST_RETURN else None
+    return call
+
+_EXPR_COMPILERS = {
+    Num: _compile_const,
+    Str: _compile_const,
+    Bool: _compile_const,
+    List_: _compile_list,
+    VarSlot: _compile_var,
+    GlobalSlot: _compile_global,
+    UpvalSlot: _compile_upval,
+    BuiltinRef: _compile_builtin_ref,
+    BinOp: _compile_binop,
+    Compare: _compile_binop,   # same operator table
+    Neg: _compile_neg,
+    LogicalOp: _compile_logical,
+    Index: _compile_index,
+    IndexConst: _compile_index_const,
+    IndexInt: _compile_index_int,
+    BuiltinCall: _compile_builtin_call,
+    Call: _compile_call,
+}
+
+def compile_expr(node: Node) -> Callable:
+    try:
+        compiler = _EXPR_COMPILERS[type(node)]
+    except KeyError:
+        raise RuntimeError(f'Unhandled expr node: {node}') from None
+    return compiler(node)
 
 # ----------------------
 # CLI
 # ----------------------
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python djerba.py <file.djerba>")
+    args = sys.argv[1:]
+    # --memo caches the pure math built-ins
+    flags = {a for a in args if a.startswith('--')}
+    args = [a for a in args if not a.startswith('--')]
+    if len(args) != 1 or not flags <= {'--memo'}:
+        print("Usage: python djerba.py [--memo] <file.djerba>")
         sys.exit(1)
-    path = sys.argv[1]
-    src = open(path, 'r', encoding='utf-8').read()
+    if '--memo' in flags:
+        memoize_builtins()
+    path = args[0]
+    # one binary read and one decode; text mode would also run every
+    # character through its newline translation
+    with open(path, 'rb') as f:
+        src = f.read().decode('utf-8')
+    if '\r' in src:
+        src = src.replace('\r\n', '\n').replace('\r', '\n')
     tokens = lex(src)
     parser = Parser(tokens)
-    ast = parser.parse()
+    ast = attach_jit(Optimizer().optimize(parser.parse()))
     eval_program(ast)
 
 if __name__ == '__main__':